@@ -1,14 +1,21 @@
-import yaml
 import json
+import logging
 import litellm
 from . import utils
-from typing import Dict
+from typing import Dict, Iterable
 from .memory import Memory
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, Template
 from .utils import optimize_text
 
+logger = logging.getLogger(__name__)
 litellm.enable_json_schema_validation = True
 
+# Used when the challenge analysis cannot be parsed at all
+FALLBACK_ANALYSIS = {
+    "category": "General",
+    "solution": "No plan available; explore the challenge step by step.",
+}
+
 
 class Analyzer:
     def __init__(self, config: dict, problem: str):
@@ -16,70 +23,102 @@ class Analyzer:
         self.env = Environment(loader=FileSystemLoader("."))
         self.llm_config: dict = self.config["llm"]["analyzer"]
         self.problem = problem
-        self.prompt: dict = yaml.safe_load(open("./prompt.yaml", "r", encoding="utf-8"))
+        self.prompt: dict = utils.load_prompts()
+        # Compile every prompt template once instead of on each LLM turn
+        self._templates: Dict[str, Template] = {
+            key: self.env.from_string(value)
+            for key, value in self.prompt.items()
+            if isinstance(value, str)
+        }
         litellm.enable_json_schema_validation = True
 
     def problem_analyze(self):
         prompt = self.prompt["problem_analyze"].replace("{question}", self.problem)
         message = [{"role": "user", "content": optimize_text(prompt)}]
-        response = litellm.completion(
+        msg_result = utils.complete_json(
             model=self.llm_config.get("model"),
             api_key=self.llm_config.get("api_key"),
             api_base=self.llm_config.get("api_base"),
             messages=message,
         )
-        msg_result = response.choices[0].message.content
-        try:
-            analyze_result = json.loads(msg_result)
-        except (json.JSONDecodeError, KeyError) as e:
-            msg_result = utils.fix_json_with_llm(msg_result, e)
-            analyze_result = json.loads(msg_result)
-
+        analyze_result = self._load_json(msg_result)
+        if not isinstance(analyze_result, dict) or not (
+            "category" in analyze_result and "solution" in analyze_result
+        ):
+            logger.warning("Unable to parse the challenge analysis, using a general plan.")
+            return dict(FALLBACK_ANALYSIS)
         return analyze_result
 
-    def analyze_step_output(
+    @staticmethod
+    def _load_json(raw: str):
+        """
+        Parse an LLM reply as JSON, repairing it when needed.
+        :param raw: Raw reply text.
+        :return: The parsed value, or {} if it could not be repaired.
+        """
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            try:
+                return json.loads(utils.fix_json_with_llm(raw, str(e)))
+            except ValueError as e:
+                logger.warning(f"Discarding unparseable LLM reply: {str(e)}")
+                return {}
+
+    def analyze_and_plan(
         self,
         memory: Memory,
         step_num: int,
         content: str,
         output: str,
         solution_plan: str,
+        problem_class: str,
+        tools: Iterable,
+        llm_config: Dict,
     ) -> Dict:
         """
-        Analyse the output of a solving step with the LLM.
+        Analyse a step's output and plan the next action in a single LLM call.
         :param step_num: Step number.
         :param content: Executed content (e.g., command).
         :param output: Command output.
         :param solution_plan: Current solution plan.
-        :return: Analysis dictionary.
+        :param problem_class: Challenge category.
+        :param tools: Tools available for the next action.
+        :param llm_config: Model settings for the call; the solve agent's, since it plans the next action.
+        :return: Dictionary with "analysis" and "next_step" entries.
         """
-        # Summarise historical context
-        history_summary = memory.get_summary()
-
-        # Render the prompt with Jinja2
-        template = self.env.from_string(self.prompt.get("step_analysis", ""))
+        # Choose the category-specific template, as generate_next_step does
+        prompt_key = problem_class.lower() + "_analyze_and_next"
+        if prompt_key not in self._templates:
+            prompt_key = "general_analyze_and_next"
+        template = self._templates[prompt_key]
         prompt = template.render(
             question=self.problem,
+            problem_class=problem_class,
             step_num=step_num,
             content=content,
-            output=output[:4096],
+            output=utils.truncate_middle(output, 2048),
             solution_plan=solution_plan,
-            history_summary=history_summary,
+            history_summary=memory.get_summary(),
+            tools=tools,
         )
 
-        # Query the LLM for the analysis
-        response = litellm.completion(
-            model=self.llm_config["model"],
-            api_key=self.llm_config["api_key"],
-            api_base=self.llm_config["api_base"],
+        raw_result = utils.complete_json(
+            model=llm_config["model"],
+            api_key=llm_config["api_key"],
+            api_base=llm_config["api_base"],
             messages=[{"role": "user", "content": optimize_text(prompt)}],
         )
-        # Parse and return the analysis result
-        try:
-            result = json.loads(response.choices[0].message.content)
-            if isinstance(result, dict):
-                return result
-        except (json.JSONDecodeError, KeyError) as e:
-            content = utils.fix_json_with_llm(response.choices[0].message.content, e)
-            result = json.loads(content)
-            return result
+        result = self._load_json(raw_result)
+        if not isinstance(result, dict):
+            result = {}
+
+        # Keep the analysis shape expected by the solve loop and memory
+        analysis = result.get("analysis", {})
+        if not isinstance(analysis, dict):
+            analysis = {"analysis": str(analysis)}
+        next_step = result.get("next_step")
+        return {
+            "analysis": analysis,
+            "next_step": next_step if isinstance(next_step, dict) else {},
+        }
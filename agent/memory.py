@@ -1,11 +1,28 @@
 import litellm
 import json
 import logging
+import hashlib
+import re
+from collections import OrderedDict
 from typing import List, Dict
-from .utils import optimize_text
+from .utils import optimize_text, truncate_middle
 
 logger = logging.getLogger(__name__)
 
+# Analyses mentioning key findings are kept as key facts
+_KEY_FINDING = re.compile(r"key finding", re.IGNORECASE)
+# Caps on retained entries; only the most recent ones are ever shown
+_MAX_KEY_FACTS = 64
+_MAX_FAILED_ATTEMPTS = 128
+
+
+def _bounded_set(mapping: OrderedDict, key: str, value, limit: int) -> None:
+    """Insert or refresh an entry, evicting the oldest ones beyond the limit."""
+    mapping[key] = value
+    mapping.move_to_end(key)
+    while len(mapping) > limit:
+        mapping.popitem(last=False)
+
 
 class Memory:
     def __init__(
@@ -23,12 +40,15 @@ class Memory:
         self.compression_threshold = compression_threshold
         self.history: List[Dict] = []  # Full history of recent steps
         self.compressed_memory: List[Dict] = []  # Compressed memory blocks
-        self.key_facts: Dict[str, str] = {}  # Structured key facts
-        self.failed_attempts: Dict[str, int] = {}  # Failed attempt counters
+        self.key_facts: Dict[str, str] = OrderedDict()  # Structured key facts
+        self.failed_attempts: Dict[str, int] = OrderedDict()  # Failed attempt counters
+        # Cached summaries keyed by include_key_facts, cleared on every change
+        self._summary_cache: Dict[bool, str] = {}
 
     def add_step(self, step: Dict) -> None:
         """Add a new step to the history and extract key information."""
         self.history.append(step)
+        self._summary_cache.clear()
 
         # Extract key facts (command, output, analysis)
         self._extract_key_facts(step)
@@ -37,7 +57,7 @@ class Memory:
         if "analysis" in step and "success" in step["analysis"]:
             if not step["analysis"]["success"]:
                 command = step.get("content", "")
-                self.failed_attempts[command] = self.failed_attempts.get(command, 0) + 1
+                self._record_failure(command)
 
         # Compress the memory when needed
         if len(self.history) >= self.compression_threshold:
@@ -51,15 +71,24 @@ class Memory:
             output_summary = step["output"][:256] + (
                 "..." if len(step["output"]) > 256 else ""
             )
-            self.key_facts["command"] = f"Command: {command}, Result: {output_summary}"
+            _bounded_set(
+                self.key_facts,
+                "command",
+                f"Command: {command}, Result: {output_summary}",
+                _MAX_KEY_FACTS,
+            )
 
         # Capture analysis conclusions
         if "analysis" in step and "analysis" in step["analysis"]:
             analysis = step["analysis"]["analysis"]
-            if isinstance(analysis, str) and any(
-                keyword in analysis.lower() for keyword in ("key finding", "key findings")
-            ):
-                self.key_facts[f"finding:{hash(analysis)}"] = analysis
+            if isinstance(analysis, str) and _KEY_FINDING.search(analysis):
+                digest = hashlib.blake2b(analysis.encode("utf-8"), digest_size=8).hexdigest()
+                _bounded_set(self.key_facts, f"finding:{digest}", analysis, _MAX_KEY_FACTS)
+
+    def _record_failure(self, command: str) -> None:
+        """Increment the failure counter for a command."""
+        count = self.failed_attempts.get(command, 0) + 1
+        _bounded_set(self.failed_attempts, command, count, _MAX_FAILED_ATTEMPTS)
 
     def compress_memory(self) -> None:
         """Compress the history into structured memory blocks."""
@@ -68,7 +97,7 @@ class Memory:
             return
 
         # Build a detailed compression prompt
-        prompt = (
+        parts: List[str] = [
             "You are a CTF solving assistant. Compress the solving history by completing these tasks:\n"
             "1. Identify key technical findings and discoveries.\n"
             "2. Record solutions that were attempted but failed.\n"
@@ -81,23 +110,25 @@ class Memory:
             '  "next_steps": ["Suggestion 1", "Suggestion 2"]\n'
             "}\n\n"
             "History:\n"
-        )
+        ]
 
         # Add key facts as context
-        prompt += "Key facts summary:\n"
+        parts.append("Key facts summary:\n")
         for _, value in list(self.key_facts.items())[-5:]:  # Only keep the latest 5
-            prompt += f"- {value}\n"
+            parts.append(f"- {value}\n")
 
         # Include historical steps
         for i, step in enumerate(self.history[-self.compression_threshold :]):
-            prompt += f"\nStep {i+1}:\n"
-            prompt += f"- Purpose: {step.get('purpose', 'unspecified')}\n"
-            prompt += f"- Command: {step['content']}\n"
+            parts.append(f"\nStep {i+1}:\n")
+            parts.append(f"- Purpose: {step.get('purpose', 'unspecified')}\n")
+            parts.append(f"- Command: {step['content']}\n")
 
             # Append analysis if present
             if "analysis" in step:
                 analysis = step["analysis"].get("analysis", "No analysis")
-                prompt += f"- Analysis: {analysis}\n"
+                parts.append(f"- Analysis: {analysis}\n")
+
+        prompt = "".join(parts)
 
         try:
             # Call the LLM to produce structured memory
@@ -116,18 +147,19 @@ class Memory:
 
             # Update failed attempt counters
             for attempt in compressed_data.get("failed_attempts", []):
-                self.failed_attempts[attempt] = self.failed_attempts.get(attempt, 0) + 1
+                self._record_failure(attempt)
 
             # Annotate with provenance metadata
             compressed_data["source_steps"] = len(self.history)
 
             self.compressed_memory.append(compressed_data)
-            print(
-                f"Memory compression succeeded: captured {len(compressed_data['key_findings'])} key findings."
+            logger.info(
+                "Memory compression succeeded: captured %d key findings.",
+                len(compressed_data["key_findings"]),
             )
 
         except (json.JSONDecodeError, KeyError) as e:
-            print(f"Unable to parse compressed memory: {str(e)}")
+            logger.warning("Unable to parse compressed memory: %s", e)
             # Fall back to storing the raw summary
             fallback = (
                 response.choices[0].message.content.strip()
@@ -138,7 +170,7 @@ class Memory:
                 {"fallback_summary": fallback, "source_steps": len(self.history)}
             )
         except Exception as e:
-            print(f"Memory compression failed: {str(e)}")
+            logger.error("Memory compression failed: %s", e)
             self.compressed_memory.append(
                 {"error": f"Compression failed: {str(e)}", "source_steps": len(self.history)}
             )
@@ -146,67 +178,83 @@ class Memory:
         # Retain the last few detailed steps for context
         keep_last = min(4, len(self.history))
         self.history = self.history[-keep_last:]
+        self._summary_cache.clear()
 
     def get_summary(self, include_key_facts: bool = True) -> str:
         """Return a consolidated memory summary."""
-        summary = ""
+        if not self.key_facts and not self.compressed_memory and not self.history:
+            return "No history"
+
+        # Reuse the cached summary until the memory changes
+        if include_key_facts in self._summary_cache:
+            return self._summary_cache[include_key_facts]
+
+        parts: List[str] = []
 
         # 1. Key fact summary
         if include_key_facts and self.key_facts:
-            summary += "Key facts:\n"
+            parts.append("Key facts:\n")
             for _, value in list(self.key_facts.items())[-10:]:  # Show up to 10 of the latest facts
-                summary += f"- {value}\n"
-            summary += "\n"
+                parts.append(f"- {value}\n")
+            parts.append("\n")
 
         # 2. Compressed memory blocks
         if self.compressed_memory:
-            summary += "Compressed memory blocks:\n"
+            parts.append("Compressed memory blocks:\n")
             for i, mem in enumerate(self.compressed_memory[-3:]):  # Show the latest three blocks
-                summary += f"Block #{len(self.compressed_memory)-i}:\n"
+                parts.append(f"Block #{len(self.compressed_memory)-i}:\n")
 
                 if "key_findings" in mem:
-                    summary += f"- Status: {mem.get('current_status', 'unknown')}\n"
-                    summary += f"- Key findings: {', '.join(mem['key_findings'][:3])}"
+                    parts.append(f"- Status: {mem.get('current_status', 'unknown')}\n")
+                    parts.append(f"- Key findings: {', '.join(mem['key_findings'][:3])}")
                     if len(mem["key_findings"]) > 3:
-                        summary += f" and {len(mem['key_findings']) - 3} more"
-                    summary += "\n"
+                        parts.append(f" and {len(mem['key_findings']) - 3} more")
+                    parts.append("\n")
 
                 if "failed_attempts" in mem:
-                    summary += f"- Failed attempts: {', '.join(mem['failed_attempts'][:3])}"
+                    parts.append(f"- Failed attempts: {', '.join(mem['failed_attempts'][:3])}")
                     if len(mem["failed_attempts"]) > 3:
-                        summary += f" and {len(mem['failed_attempts']) - 3} more"
-                    summary += "\n"
+                        parts.append(f" and {len(mem['failed_attempts']) - 3} more")
+                    parts.append("\n")
 
                 if "next_steps" in mem:
-                    summary += f"- Suggested next step: {mem['next_steps'][0]}\n"
+                    parts.append(f"- Suggested next step: {mem['next_steps'][0]}\n")
 
-                summary += f"- Source: based on {mem['source_steps']} historical steps\n\n"
+                parts.append(f"- Source: based on {mem['source_steps']} historical steps\n\n")
 
         # 3. Recent detailed steps
         if self.history:
-            summary += "Recent detailed steps:\n"
+            parts.append("Recent detailed steps:\n")
+            seen_commands: Dict[str, int] = {}  # Command -> first step showing it
             for i, step in enumerate(self.history):
                 step_num = len(self.history) - i
-                summary += f"Step {step_num}:\n"
-                summary += f"- Purpose: {step.get('purpose', 'unspecified')}\n"
-                summary += f"- Command: {step['content']}\n"
+                parts.append(f"Step {step_num}:\n")
+                parts.append(f"- Purpose: {step.get('purpose', 'unspecified')}\n")
+
+                # Avoid repeating a command that was already listed
+                command = step["content"]
+                if command in seen_commands:
+                    parts.append(f"- Command: same as Step {seen_commands[command]}\n")
+                else:
+                    seen_commands[command] = step_num
+                    parts.append(f"- Command: {command}\n")
 
                 # Include output and analysis excerpts
                 if "output" in step:
-                    output = step["output"]
-                    summary += (
-                        f"- Output: {output[:512]}{'...' if len(output) > 512 else ''}\n"
-                    )
+                    parts.append(f"- Output: {truncate_middle(step['output'], 256)}\n")
 
                 if "analysis" in step:
                     analysis = step["analysis"].get("analysis", "No analysis")
-                    summary += f"- Analysis: {analysis}\n"
+                    parts.append(f"- Analysis: {analysis}\n")
 
                 # Show failure counts
                 if "content" in step and step["content"] in self.failed_attempts:
-                    summary += (
+                    parts.append(
                         f"- Historical failure count: {self.failed_attempts[step['content']]}\n"
                     )
 
-                summary += "\n"
-        return summary if summary else "No history"
+                parts.append("\n")
+
+        summary = "".join(parts) or "No history"
+        self._summary_cache[include_key_facts] = summary
+        return summary
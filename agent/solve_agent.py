@@ -1,19 +1,18 @@
 import litellm
 import json
 import time
-import yaml
 import os
 import logging
-import inspect
 import importlib
+from concurrent.futures import ThreadPoolExecutor
 from ctf_tool.base_tool import BaseTool
 from litellm import ModelResponse
 from .analyzer import Analyzer
 from typing import Dict, Tuple, Optional, List
 from .memory import Memory
-from .utils import optimize_text
+from .utils import optimize_text, truncate_middle
 from . import utils
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, Template
 
 logger = logging.getLogger(__name__)
 litellm.enable_json_schema_validation = True
@@ -24,12 +23,18 @@ class SolveAgent:
         self.config = config
         self.llm_config = self.config["llm"]["solve_agent"]
         self.problem = problem
-        self.prompt: dict = yaml.safe_load(open("./prompt.yaml", "r", encoding="utf-8"))
+        self.prompt: dict = utils.load_prompts()
         if self.config is None:
             raise ValueError("Configuration file not found")
 
         # Initialise the Jinja2 template environment
         self.env = Environment(loader=FileSystemLoader("."))
+        # Compile every prompt template once instead of on each LLM turn
+        self._templates: Dict[str, Template] = {
+            key: self.env.from_string(value)
+            for key, value in self.prompt.items()
+            if isinstance(value, str)
+        }
 
         # Initialise the memory system
         self.memory = Memory(
@@ -74,44 +79,56 @@ class SolveAgent:
     def _load_tools(self):
         """Dynamically import every tool module."""
         tools_dir = os.path.join(os.path.dirname(__file__), "..", "ctf_tool")
+        module_names = [
+            file_name[:-3]  # Strip the .py suffix
+            for file_name in os.listdir(tools_dir)
+            if file_name.endswith(".py")
+            and file_name != "__init__.py"
+            and file_name != "base_tool.py"
+        ]
+
+        # Import the modules concurrently; registration stays sequential below
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            modules = list(executor.map(self._import_tool_module, module_names))
+
+        for module_name, module in zip(module_names, modules):
+            if isinstance(module, Exception):
+                logger.warning(f"Failed to load tool module {module_name}: {str(module)}")
+                continue
+            try:
+                # Find every class inheriting from BaseTool defined in this module
+                for name, obj in list(vars(module).items()):
+                    if (
+                        isinstance(obj, type)
+                        and issubclass(obj, BaseTool)
+                        and obj is not BaseTool
+                        and obj.__module__ == module.__name__
+                    ):
+                        # Instantiate with custom config when provided
+                        if name in self.config.get("tool_config", {}):
+                            tool_config = self.config["tool_config"][name]
+                            tool_instance = obj(tool_config)
+                        else:
+                            tool_instance = obj()
+
+                        # Register the tool
+                        tool_name = tool_instance.function_config["function"]["name"]
+                        self.tools[tool_name] = tool_instance
+
+                        # Collect its function-call schema
+                        self.function_configs.append(tool_instance.function_config)
+
+                        logger.info(f"Loaded tool: {tool_name}")
+            except Exception as e:
+                logger.warning(f"Failed to load tool module {module_name}: {str(e)}")
 
-        for file_name in os.listdir(tools_dir):
-            if (
-                file_name.endswith(".py")
-                and file_name != "__init__.py"
-                and file_name != "base_tool.py"
-            ):
-                module_name = file_name[:-3]  # Strip the .py suffix
-                try:
-                    # Import the module
-                    module = importlib.import_module(f"ctf_tool.{module_name}")
-
-                    # Find every class inheriting from BaseTool
-                    for name, obj in inspect.getmembers(module):
-                        if (
-                            inspect.isclass(obj)
-                            and issubclass(obj, BaseTool)
-                            and obj != BaseTool
-                        ):
-                            # Instantiate with custom config when provided
-                            if name in self.config.get("tool_config", {}):
-                                tool_config = self.config["tool_config"][name]
-                                tool_instance = obj(tool_config)
-                            else:
-                                tool_instance = obj()
-
-                            # Register the tool
-                            tool_name = tool_instance.function_config["function"][
-                                "name"
-                            ]
-                            self.tools[tool_name] = tool_instance
-
-                            # Collect its function-call schema
-                            self.function_configs.append(tool_instance.function_config)
-
-                            logger.info(f"Loaded tool: {tool_name}")
-                except Exception as e:
-                    logger.warning(f"Failed to load tool module {module_name}: {str(e)}")
+    @staticmethod
+    def _import_tool_module(module_name: str):
+        """Import a tool module, returning the exception instead of raising it."""
+        try:
+            return importlib.import_module(f"ctf_tool.{module_name}")
+        except Exception as e:
+            return e
 
     def solve(self, problem_class: str, solution_plan: str) -> str:
         """
@@ -121,14 +138,15 @@ class SolveAgent:
         :return: The confirmed flag, or a status string if unsuccessful.
         """
         step_count = 0
+        # Action planned alongside the previous step's analysis, if any
+        next_step: Optional[Dict] = None
 
         while True:
             step_count += 1
             print(f"\nThinking through step {step_count}...")
 
-            # Generate the next action
-            next_step = None
-            while next_step is None:
+            # Generate the next action unless it was already planned
+            while not next_step:
                 next_step = self.generate_next_step(problem_class, solution_plan)
                 if next_step:
                     break
@@ -164,12 +182,27 @@ class SolveAgent:
             else:
                 output = f"Error: tool '{tool_name}' was not found"
 
-            logger.info(f"Command output:\n{output}")
-
-            # Analyse the output with the LLM
-            analysis_result = self.analyzer.analyze_step_output(
-                self.memory, step_count, content, output, solution_plan
+            # Bound huge outputs before they are analysed and kept in memory;
+            # the log file still receives the complete output
+            truncated = truncate_middle(output, 4096)
+            if truncated != output:
+                logger.debug("Full command output:\n%s", output)
+                output = truncated
+            logger.info("Command output:\n%s", output)
+
+            # Analyse the output and plan the following action in one LLM call
+            plan = self.analyzer.analyze_and_plan(
+                self.memory,
+                step_count,
+                content,
+                output,
+                solution_plan,
+                problem_class,
+                self.tools.values(),
+                self.llm_config,
             )
+            analysis_result = plan["analysis"]
+            next_step = self._parse_tool_call_data(plan["next_step"])
 
             # Check whether the LLM detected a flag
             if analysis_result.get("flag_found", False):
@@ -230,7 +263,7 @@ class SolveAgent:
         """
         history_summary = self.memory.get_summary()
 
-        template = self.env.from_string(self.prompt.get("reflection", ""))
+        template = self._templates["reflection"]
         prompt = template.render(
             question=self.problem,
             original_purpose=purpose,
@@ -263,11 +296,11 @@ class SolveAgent:
 
         # Choose the appropriate prompt template for the category
         prompt_key = problem_class.lower() + "_next"
-        if prompt_key not in self.prompt:
+        if prompt_key not in self._templates:
             prompt_key = "general_next"
 
         # Render the prompt
-        template = self.env.from_string(self.prompt.get(prompt_key, ""))
+        template = self._templates[prompt_key]
         prompt = template.render(
             question=self.problem,
             solution_plan=solution_plan,
@@ -290,42 +323,65 @@ class SolveAgent:
 
     def parse_tool_response(self, response: ModelResponse) -> Dict:
         """Normalise tool-call responses returned by the LLM."""
-        message = response.choices[0].message
+        try:
+            message = response.choices[0].message
+        except (AttributeError, IndexError) as e:
+            print(f"Failed to parse tool-call response: {e}")
+            return {}
 
         # Case 1: tool_calls field populated directly
-        if hasattr(message, "tool_calls") and message.tool_calls:
+        if getattr(message, "tool_calls", None):
             tool_call = message.tool_calls[0]
             func_name = tool_call.function.name
+            raw_args = tool_call.function.arguments
             try:
-                args = json.loads(tool_call.function.arguments)
+                args = json.loads(raw_args)
             except json.JSONDecodeError as e:
-                args = utils.fix_json_with_llm(tool_call.function.arguments, e)
-
-            # Ensure purpose and content are available
-            args.setdefault("purpose", "Execute action")
-            args.setdefault("content", "")
+                try:
+                    args = json.loads(utils.fix_json_with_llm(raw_args, str(e)))
+                except ValueError as e:
+                    print(f"Failed to parse tool-call arguments: {e}")
+                    return {}
+            if not isinstance(args, dict):
+                return {}
+            return self._build_step(func_name, args)
 
         # Case 2: message content is a JSON string
-        else:
-            content = message.content.strip()
-            # Attempt to parse JSON directly
+        raw_content = (message.content or "").strip()
+        try:
+            data = json.loads(raw_content)
+        except json.JSONDecodeError as e:
+            print("Unable to parse tool-call response, attempting repair...")
             try:
-                data = json.loads(content)
-            except json.JSONDecodeError as e:
-                print("Unable to parse tool-call response, attempting repair...")
-                content = utils.fix_json_with_llm(content, e)
-                data = json.loads(content)
-            except Exception as e:
+                data = json.loads(utils.fix_json_with_llm(raw_content, str(e)))
+            except ValueError as e:
                 print(f"Failed to parse tool-call response: {e}")
                 return {}
-            if "tool_calls" in data and data["tool_calls"]:
-                tool_call: dict = data["tool_calls"][0]
-                func_name: dict = tool_call.get("name", "tool_parse_failed")
-                args: dict = tool_call.get("arguments", {})
-                args.setdefault("purpose", "Execute action")
-                args.setdefault("content", "")
+        return self._parse_tool_call_data(data)
+
+    def _parse_tool_call_data(self, data: Dict) -> Dict:
+        """Extract the first tool call from a JSON {"tool_calls": [...]} payload."""
+        if not isinstance(data, dict):
+            return {}
+        tool_calls = data.get("tool_calls")
+        if not isinstance(tool_calls, list) or not tool_calls:
+            return {}
+        tool_call = tool_calls[0]
+        if not isinstance(tool_call, dict):
+            return {}
+        func_name: str = tool_call.get("name", "tool_parse_failed")
+        args = tool_call.get("arguments", {})
+        if not isinstance(args, dict):
+            return {}
+        return self._build_step(func_name, args)
+
+    def _build_step(self, func_name: str, args: Dict) -> Dict:
+        """Fill in default arguments and package a tool call as a step."""
+        # Ensure purpose and content are available
+        args.setdefault("purpose", "Execute action")
+        args.setdefault("content", "")
 
         logger.info(f"Tool selected: {func_name}")
         logger.info(f"Purpose: {args['purpose']}")
-        logger.info(f"Command:\n{args['content']}")
+        logger.info("Command:\n%s", args["content"])
         return {"tool_name": func_name, "arguments": args}
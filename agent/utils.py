@@ -1,17 +1,171 @@
 import litellm
+import httpx
 import re
 import json
+import yaml
+import logging
+import functools
+import itertools
+from typing import List, Optional
 from config import Config
 
+logger = logging.getLogger(__name__)
 
-def fix_json_with_llm(json_str: str, err_content: str) -> str:
+# Share one pooled HTTP client so every completion reuses keep-alive connections
+litellm.client_session = httpx.Client(timeout=httpx.Timeout(600.0, connect=10.0))
+
+# Prefer the libyaml-backed loader when it is available
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=1)
+def load_prompts() -> dict:
+    """
+    Load prompt.yaml once and share the parsed dict across the agent.
+    :return: Mapping of prompt names to template strings.
+    """
+    with open("./prompt.yaml", "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+
+def _close_stream(stream) -> None:
+    """Close a completion stream so the server stops generating and the connection is released."""
+    # litellm wraps the provider stream, which in turn owns the HTTP response
+    for target in (
+        stream,
+        getattr(stream, "completion_stream", None),
+        getattr(stream, "response", None),
+    ):
+        close = getattr(target, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.debug("Failed to close completion stream: %s", e)
+
+
+# Errors meaning the provider cannot stream; anything else is a real failure
+_STREAMING_UNSUPPORTED = (litellm.UnsupportedParamsError, NotImplementedError)
+
+
+def _complete_unstreamed(error: Exception, completion_kwargs: dict) -> str:
+    """Retry a completion without streaming after the provider rejected it."""
+    logger.debug("Streaming unsupported, using a regular completion: %s", error)
+    response = litellm.completion(**completion_kwargs)
+    return response.choices[0].message.content or ""
+
+
+def complete_json(**completion_kwargs) -> str:
+    """
+    Stream a completion and stop reading once a complete JSON value has arrived.
+    Falls back to a regular completion when the provider does not support streaming.
+    :param completion_kwargs: Arguments forwarded to litellm.completion.
+    :return: The first bracketed span that parses as JSON, or the full response text.
+    """
+    try:
+        stream = litellm.completion(stream=True, **completion_kwargs)
+    except _STREAMING_UNSUPPORTED as e:
+        return _complete_unstreamed(e, completion_kwargs)
+
+    received: List[str] = []
+    consumed = 0  # Length of the text received before the current delta
+    value_start = 0
+    depth = 0
+    in_string = escaped = False
+    try:
+        chunks = iter(stream)
+        try:
+            # Some providers only reject streaming once the first chunk is read
+            first = [next(chunks)]
+        except StopIteration:
+            first = []
+        except _STREAMING_UNSUPPORTED as e:
+            return _complete_unstreamed(e, completion_kwargs)
+        for chunk in itertools.chain(first, chunks):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            received.append(delta)
+            for index, char in enumerate(delta):
+                if depth == 0:
+                    if char in "{[":
+                        depth = 1
+                        value_start = consumed + index
+                elif in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char in "{[":
+                    depth += 1
+                elif char in "}]":
+                    depth -= 1
+                    if depth == 0:
+                        candidate = "".join(received)[value_start : consumed + index + 1]
+                        try:
+                            json.loads(candidate)
+                            # Anything after the closing bracket is never read
+                            return candidate
+                        except json.JSONDecodeError:
+                            # A bracketed aside in prose, not the answer; keep reading
+                            pass
+            consumed += len(delta)
+    finally:
+        _close_stream(stream)
+    return "".join(received)
+
+
+# Markdown code fences that models like to wrap JSON answers in
+_CODE_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+# Trailing commas before a closing brace or bracket
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+# Runs of two or more spaces inside prompt text
+_MULTISPACE = re.compile(r" {2,}")
+# Anything optimize_text would change: double spaces, blank or whitespace-only
+# lines, leading/trailing whitespace, and line breaks other than "\n"
+_UNTIDY = re.compile(r" {2}|\n\s|^\s|\s$|[\r\v\f\x1c-\x1e\x85\u2028\u2029]")
+
+
+def repair_json_locally(json_str: str) -> Optional[str]:
+    """
+    Fix common LLM JSON mistakes without another model call.
+    Strips code fences and surrounding prose, then drops trailing commas.
+    :param json_str: The malformed JSON string.
+    :return: A valid JSON string, or None if it could not be repaired.
+    """
+    text = _CODE_FENCE.sub("", json_str.strip())
+    # Discard any narration before the first bracket and after the last one
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    end = max(text.rfind("}"), text.rfind("]"))
+    if starts and end > min(starts):
+        text = text[min(starts) : end + 1]
+
+    for candidate in (text, _TRAILING_COMMA.sub(r"\1", text)):
+        try:
+            json.loads(candidate)
+            return candidate
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def fix_json_with_llm(json_str: str, err_content: str, max_retries: int = 3) -> str:
     """
-    Repair malformed JSON by asking the configured LLM to rewrite it.
+    Repair malformed JSON, falling back to the configured LLM when needed.
     :param json_str: The malformed JSON string.
     :param err_content: The parsing error message.
+    :param max_retries: Maximum number of LLM repair attempts.
     :return: A corrected JSON string.
     """
-    config: dict = Config.load_config()
+    fixed_json = repair_json_locally(json_str)
+    if fixed_json is not None:
+        return fixed_json
+
+    config: dict = Config().config
     litellm.enable_json_schema_validation = True
     prompt = (
         "The following string is invalid JSON. Repair it so that it becomes valid JSON.\n"
@@ -22,26 +176,43 @@ def fix_json_with_llm(json_str: str, err_content: str) -> str:
     )
     llm_config = config["llm"]["pre_processor"]
 
-    while True:
+    for _ in range(max_retries):
         response = litellm.completion(
             model=llm_config["model"],
             api_key=llm_config["api_key"],
             api_base=llm_config["api_base"],
             messages=[{"role": "user", "content": prompt}],
         )
-        fixed_json = response.choices[0].message.content
-        try:
-            json.loads(fixed_json)
+        fixed_json = repair_json_locally(response.choices[0].message.content or "")
+        if fixed_json is not None:
             return fixed_json
-        except:
-            continue
+
+    raise ValueError(f"Unable to repair JSON after {max_retries} attempts")
+
+
+def truncate_middle(text: str, keep: int) -> str:
+    """
+    Shorten long text by keeping its head and tail.
+    Error messages usually sit at the end of tool output, so the tail is kept too.
+    :param text: Text to shorten.
+    :param keep: Number of characters to keep from each end.
+    :return: The original text, or its head and tail around a truncation marker.
+    """
+    if len(text) <= keep * 2:
+        return text
+    return f"{text[:keep]}...[{len(text) - keep * 2} chars truncated]...{text[-keep:]}"
 
 
 def optimize_text(text: str) -> str:
-    # Collapse runs of two or more spaces to a temporary marker
-    text = re.sub(r" {2,}", "\x00", text)  # \x00 is unlikely to appear in content
-    # Restore the marker to a single space
-    text = text.replace("\x00", " ")
-    text = re.sub(r"\n+", "\n", text)
-    lines = [line for line in text.splitlines() if line.strip()]
-    return "\n".join(lines)
+    """
+    Tidy prompt text before it is sent to the LLM.
+    :param text: Prompt text.
+    :return: Text with runs of spaces collapsed and blank lines dropped.
+    """
+    # Already tidy text is the common case for rendered templates
+    if not _UNTIDY.search(text):
+        return text
+    # Collapse runs of spaces and drop blank lines in a single pass
+    return "\n".join(
+        _MULTISPACE.sub(" ", line) for line in text.splitlines() if line.strip()
+    )
@@ -1,9 +1,10 @@
 import logging
 import litellm
-import yaml
+from concurrent.futures import ThreadPoolExecutor
 from .analyzer import Analyzer
 from .solve_agent import SolveAgent
 from .utils import optimize_text
+from . import utils
 
 logger = logging.getLogger(__name__)
 
@@ -12,23 +13,26 @@ class Workflow:
     def __init__(self, config: dict):
         self.config = config
         self.processor_llm: dict = self.config["llm"]["pre_processor"]
-        self.prompt: dict = yaml.safe_load(open("./prompt.yaml", "r", encoding="utf-8"))
+        self.prompt: dict = utils.load_prompts()
         if self.config is None:
             raise ValueError("Configuration file is missing")
 
     def solve(self, problem: str) -> str:
         problem = self.summary_problem(problem)
-        # Analyse the challenge
+        # Analyse the challenge in the background while tools are loaded
         analyzer = Analyzer(self.config, problem)
-        analysis_result = analyzer.problem_analyze()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            analysis_future = executor.submit(analyzer.problem_analyze)
+
+            # Create the SolveAgent and attach the flag confirmation callback
+            agent = SolveAgent(self.config, problem)
+            agent.confirm_flag_callback = self.confirm_flag
+
+            analysis_result = analysis_future.result()
         logger.info(
             f"Challenge category: {analysis_result['category']}\nPlan: {analysis_result['solution']}"
         )
 
-        # Create the SolveAgent and attach the flag confirmation callback
-        agent = SolveAgent(self.config, problem)
-        agent.confirm_flag_callback = self.confirm_flag
-
         # Pass the category and solution plan to the agent
         return agent.solve(analysis_result["category"], analysis_result["solution"])
 
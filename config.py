@@ -1,38 +1,77 @@
 import json
 import os
+import functools
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library is the fallback
+    orjson = None
+
+
+def _loads(data: bytes):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def _dumps(data) -> bytes:
+    # Writes always use the stdlib so config.json keeps the same on-disk format
+    return json.dumps(data, indent=4).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=8)
+def _load_cached(config_path: str, mtime_ns: int) -> dict:
+    """Parse a configuration file; cached per path and modification time."""
+    with open(config_path, "rb") as f:
+        try:
+            config: dict = _loads(f.read())
+        except ValueError:  # Covers both json and orjson decode errors
+            raise ValueError(f"Configuration file {config_path} is not valid JSON")
+    # Normalize every model field within the llm section; already prefixed
+    # names (e.g. written back by Config.set) are left untouched
+    if "llm" in config:
+        for agent in config["llm"].values():
+            model = agent.get("model")
+            if model is not None and not model.startswith("openai/"):
+                agent["model"] = "openai/" + model
+    return config
 
 
 class Config:
-    def __init__(self, config_path="./config.json"):
-        self.config_path = config_path
-        self.config = self.load_config()
+    _instance = None
+
+    def __new__(cls, config_path="./config.json"):
+        # A single parsed configuration is shared by the whole process
+        if cls._instance is None:
+            instance = super().__new__(cls)
+            instance.config_path = config_path
+            instance.config = cls.load_config(config_path)
+            cls._instance = instance
+        return cls._instance
 
     @classmethod
     def load_config(cls, config_path="./config.json") -> dict:
-        if os.path.exists(config_path):
-            with open(config_path, "r", encoding="utf-8") as f:
-                try:
-                    config:dict = json.load(f)
-                    # Normalize every model field within the llm section
-                    if "llm" in config:
-                        for agent in config["llm"].values():
-                            if "model" in agent:
-                                agent["model"] = "openai/" + agent["model"]
-                    return config
-                except json.JSONDecodeError:
-                    raise ValueError(f"Configuration file {config_path} is not valid JSON")
-        else:
+        if not os.path.exists(config_path):
             raise ValueError(f"Configuration file {config_path} was not found")
+        # Re-parse only when the file changed since it was last read
+        return _load_cached(
+            os.path.abspath(config_path), os.stat(config_path).st_mtime_ns
+        )
 
     @classmethod
-    def get_tool_config(cls, tool_name: str, config_path="./config.json") -> dict:
-        config = cls.load_config(config_path)
-        return config["tool_config"][tool_name]
+    def get_tool_config(cls, tool_name: str) -> dict:
+        return (cls._instance or cls()).config["tool_config"][tool_name]
 
     def get(self, key, default=None):
         return self.config.get(key, default)
 
     def set(self, key, value):
+        # Skip rewriting the file when nothing changes
+        if key in self.config and self.config[key] == value:
+            return
         self.config[key] = value
-        with open(self.config_path, "w", encoding="utf-8") as f:
-            json.dump(self.config, f, indent=4)
+        # Write to a temporary file and swap it in so a crash never leaves a truncated config
+        tmp_path = self.config_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_dumps(self.config))
+        os.replace(tmp_path, self.config_path)
+        # mtime resolution can be coarse, so do not rely on it to spot this write
+        _load_cached.cache_clear()
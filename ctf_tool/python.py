@@ -1,29 +1,18 @@
-import paramiko
 import subprocess
 import sys
-import tempfile
-import os
-import time
-import logging
+import base64
 from ctf_tool.base_tool import BaseTool
-from config import Config
+from ctf_tool.ssh_shell import SSHShell
 from typing import Tuple, Dict
 
-logger = logging.getLogger(__name__)
-
 
 class PythonTool(BaseTool):
     def __init__(self):
         # Ask whether the user wants to execute code remotely
         self.remote = self.ask_remote_execution()
         if self.remote:
-            ssh_config: dict = Config.get_tool_config("ssh_shell")
-            self.hostname = ssh_config.get("host")
-            self.port = ssh_config.get("port", 22)
-            self.username = ssh_config.get("username")
-            self.password = ssh_config.get("password")
-            self.ssh_client = None
-            self._connect()
+            # Reuse the shell tool's SSH connection instead of opening another one
+            self.ssh = SSHShell()
 
     def ask_remote_execution(self) -> bool:
         """Prompt the user to decide whether to run code remotely."""
@@ -44,89 +33,26 @@ class PythonTool(BaseTool):
 
     def _execute_locally(self, content: str) -> Tuple[str, str]:
         try:
-            with tempfile.NamedTemporaryFile(suffix=".py", delete=False) as tmp:
-                tmp.write(content.encode("utf-8"))
-                tmp_path = tmp.name
-
+            # Feed the code through stdin instead of a temporary file
             result = subprocess.run(
-                [sys.executable, tmp_path], capture_output=True, text=True, timeout=30
+                [sys.executable, "-"],
+                input=content.encode("utf-8"),
+                capture_output=True,
+                timeout=30,
+            )
+            return (
+                result.stdout.decode("utf-8", errors="replace"),
+                result.stderr.decode("utf-8", errors="replace"),
             )
-            os.unlink(tmp_path)
-            return result.stdout, result.stderr
         except Exception as e:
             return "", str(e)
 
     def _execute_remotely(self, content: str) -> Tuple[str, str]:
-        temp_name = f"py_script_{int(time.time())}.py"
-
-        # Upload the script and execute it remotely
-        upload_cmd = f"cat > {temp_name} << 'EOF'\n{content}\nEOF"
-        self._shell_execute({"content": upload_cmd})
-        stdout, stderr = self._shell_execute({"content": f"python3 {temp_name}"})
-        self._shell_execute({"content": f"rm -f {temp_name}"})
-
-        return stdout, stderr
-
-    def _is_connected(self):
-        """Verify that the SSH connection is still alive."""
-        if not self.ssh_client:
-            return False
-        try:
-            transport = self.ssh_client.get_transport()
-            return transport and transport.is_active()
-        except Exception:
-            return False
-
-    def _connect(self):
-        """Establish or refresh the SSH connection."""
-        try:
-            if self.ssh_client:
-                self.ssh_client.close()
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            client.connect(
-                hostname=self.hostname,
-                port=self.port,
-                username=self.username,
-                password=self.password,
-                timeout=10,
-            )
-            self.ssh_client = client
-            logger.info(f"SSH connection established: {self.username}@{self.hostname}:{self.port}")
-        except Exception as e:
-            logger.error(f"Failed to connect over SSH: {str(e)}")
-            raise ConnectionError(f"Failed to connect over SSH: {str(e)}")
-
-    def _shell_execute(self, arguments: dict):
-        # Check the connection and reconnect if necessary
-        if not self._is_connected():
-            logger.warning("SSH session dropped, attempting to reconnect...")
-            self._connect()
-
-        # Extract the command from the arguments
-        command = arguments.get("content", "")
-        if not command:
-            return "", "Error: no command content provided"
-
-        try:
-            _, stdout, stderr = self.ssh_client.exec_command(command)
-
-            # Read output
-            stdout_bytes = stdout.read()
-            stderr_bytes = stderr.read()
-
-            # Decode safely
-            def safe_decode(data: bytes) -> str:
-                try:
-                    return data.decode("utf-8")
-                except UnicodeDecodeError:
-                    return data.decode("utf-8", errors="replace")
-
-            return safe_decode(stdout_bytes), safe_decode(stderr_bytes)
-
-        except Exception as e:
-            logger.error(f"Command execution failed: {str(e)}")
-            return "", f"Command execution error: {str(e)}"
+        # Pipe the script into the interpreter in one command; nothing touches the remote disk
+        encoded = base64.b64encode(content.encode("utf-8")).decode("ascii")
+        return self.ssh.execute(
+            {"content": f"printf '%s' '{encoded}' | base64 -d | python3 -"}
+        )
 
     @property
     def function_config(self) -> Dict:
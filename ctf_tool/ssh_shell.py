@@ -1,27 +1,123 @@
-from typing import Dict
+from typing import Dict, Tuple
 from config import Config
 from ctf_tool.base_tool import BaseTool
 import paramiko
+import base64
+import select
+import uuid
 import os
+import shlex
+import tarfile
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Seconds between SSH keepalive messages on an otherwise idle connection
+SSH_KEEPALIVE_INTERVAL = 30
+# SFTP channel window (128 MiB) for the per-file upload fallback
+SFTP_WINDOW_SIZE = 2**27
+
+
+class ShellSession:
+    """A long-lived remote shell that runs commands over a single SSH channel."""
+
+    def __init__(self, ssh_client: paramiko.SSHClient):
+        # No PTY: commands are not echoed and stderr stays separate from stdout
+        self.channel = ssh_client.get_transport().open_session()
+        self.channel.exec_command("command -v bash >/dev/null && exec bash -s || exec sh -s")
+        self._marker = f"__END_{uuid.uuid4().hex}__".encode()
+
+    def is_active(self) -> bool:
+        """Check whether the remote shell is still running."""
+        return not self.channel.closed and not self.channel.exit_status_ready()
+
+    def run(self, command: str) -> Tuple[bytes, bytes]:
+        """
+        Run a command in the shell and collect its output.
+        :param command: Shell command to run.
+        :return: Raw stdout and stderr bytes.
+        """
+        # Pass the command base64-encoded so quoting or syntax errors in it
+        # cannot swallow the end markers, and keep it off the session's stdin
+        encoded = base64.b64encode(command.encode("utf-8")).decode("ascii")
+        marker = self._marker.decode()
+        self._discard_pending()
+        self.channel.sendall(
+            (
+                f"eval \"$(printf '%s' '{encoded}' | base64 -d)\" < /dev/null; "
+                f"printf '\\n{marker}\\n'; printf '\\n{marker}\\n' >&2\n"
+            ).encode()
+        )
+
+        end = b"\n" + self._marker
+        stdout, stderr = bytearray(), bytearray()
+        stdout_done = stderr_done = False
+        while not (stdout_done and stderr_done):
+            # Drain both streams on every pass so neither can fill its window
+            # and stall the remote command while the other is being read.
+            # Only the newly received tail needs to be searched for the marker,
+            # and a stream is no longer read once its marker has been seen.
+            received = False
+            if not stdout_done and self.channel.recv_ready():
+                start = max(len(stdout) - len(end), 0)
+                stdout += self.channel.recv(65536)
+                stdout_done = stdout.find(end, start) != -1
+                received = True
+            if not stderr_done and self.channel.recv_stderr_ready():
+                start = max(len(stderr) - len(end), 0)
+                stderr += self.channel.recv_stderr(65536)
+                stderr_done = stderr.find(end, start) != -1
+                received = True
+            if received:
+                continue
+            if not self.is_active():
+                # The command exited the shell; return whatever was produced
+                break
+            select.select([self.channel], [], [], 0.1)
+
+        return bytes(stdout.split(end, 1)[0]), bytes(stderr.split(end, 1)[0])
+
+    def _discard_pending(self):
+        """Drop output left over from earlier commands, e.g. from background jobs."""
+        while self.channel.recv_ready():
+            self.channel.recv(65536)
+        while self.channel.recv_stderr_ready():
+            self.channel.recv_stderr(65536)
+
+    def close(self):
+        self.channel.close()
+
 
 class SSHShell(BaseTool):
-    def __init__(self):
-        ssh_config: dict = Config.get_tool_config("ssh_shell")
-        self.hostname = ssh_config.get("host")
-        self.port = ssh_config.get("port", 22)
-        self.username = ssh_config.get("username")
-        self.password = ssh_config.get("password")
-        self.ssh_client = None
+    _instance = None
+
+    def __new__(cls):
+        # One SSH connection is shared by every tool that talks to the remote host
+        if cls._instance is None:
+            instance = super().__new__(cls)
+            ssh_config: dict = Config.get_tool_config("ssh_shell")
+            instance.hostname = ssh_config.get("host")
+            instance.port = ssh_config.get("port", 22)
+            instance.username = ssh_config.get("username")
+            instance.password = ssh_config.get("password")
+            instance.ssh_client = None
+            instance.session = None
+            # Connecting and uploading attachments are deferred until first use
+            instance._ready = False
+            cls._instance = instance
+        return cls._instance
+
+    def _ensure_ready(self):
+        """Connect and upload attachments the first time the tool is used."""
+        if self._ready:
+            return
+        self._connect()
+        self._ready = True
         # Upload attachments if the directory is not empty
-        if len(os.listdir("./attachments")) > 0:
+        if os.path.isdir("./attachments") and len(os.listdir("./attachments")) > 0:
             logger.info("Attachments detected, uploading to the remote host...")
             self.upload_folder("./attachments", ".")
             logger.info("Attachment upload complete.")
-        self._connect()  # Connect immediately during initialization
 
     def _connect(self):
         """Establish or refresh the SSH connection."""
@@ -36,8 +132,13 @@ class SSHShell(BaseTool):
                 username=self.username,
                 password=self.password,
                 timeout=10,
+                banner_timeout=10,
+                auth_timeout=10,
             )
+            # Keepalives stop NAT and firewalls from dropping an idle session mid-run
+            client.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
             self.ssh_client = client
+            self.session = ShellSession(client)
             logger.info(f"SSH connection established: {self.username}@{self.hostname}:{self.port}")
         except Exception as e:
             logger.error(f"Failed to connect over SSH: {str(e)}")
@@ -54,6 +155,7 @@ class SSHShell(BaseTool):
             return False
 
     def execute(self, arguments: dict):
+        self._ensure_ready()
         # Check the connection and reconnect if necessary
         if not self._is_connected():
             logger.warning("SSH session dropped, attempting to reconnect...")
@@ -65,64 +167,115 @@ class SSHShell(BaseTool):
             return "", "Error: no command content provided"
 
         try:
-            _, stdout, stderr = self.ssh_client.exec_command(command)
-
-            # Read output
-            stdout_bytes = stdout.read()
-            stderr_bytes = stderr.read()
+            # Reopen the shell if a previous command exited it
+            if not self.session.is_active():
+                self.session = ShellSession(self.ssh_client)
 
-            # Decode safely
-            def safe_decode(data: bytes) -> str:
-                try:
-                    return data.decode("utf-8")
-                except UnicodeDecodeError:
-                    return data.decode("utf-8", errors="replace")
+            stdout_bytes, stderr_bytes = self.session.run(command)
 
-            return safe_decode(stdout_bytes), safe_decode(stderr_bytes)
+            # Invalid UTF-8 sequences are replaced instead of raising
+            return (
+                stdout_bytes.decode("utf-8", errors="replace"),
+                stderr_bytes.decode("utf-8", errors="replace"),
+            )
 
         except Exception as e:
             logger.error(f"Command execution failed: {str(e)}")
             return "", f"Command execution error: {str(e)}"
 
     def upload_folder(self, local_path, remote_path):
+        self._ensure_ready()
         if not self._is_connected():
             logger.warning("SSH session dropped, attempting to reconnect...")
             self._connect()
 
         try:
-            sftp = self.ssh_client.open_sftp()
+            self._upload_via_tar(local_path, remote_path)
+            return f"Successfully uploaded folder: {local_path} -> {remote_path}"
+        except Exception as e:
+            logger.warning(f"Streaming tar upload failed, falling back to SFTP: {str(e)}")
+
+        return self._upload_via_sftp(local_path, remote_path)
 
-            # Ensure the remote path exists
+    def _upload_via_tar(self, local_path, remote_path):
+        """Stream the folder as a single gzipped tar archive into a remote tar."""
+        remote_dir = shlex.quote(remote_path)
+        # Extracted files belong to the remote user with its umask applied, and
+        # existing directories (such as the remote home) keep their metadata
+        stdin, stdout, _ = self.ssh_client.exec_command(
+            f"mkdir -p {remote_dir} && tar -xzf - -C {remote_dir} "
+            "--no-same-owner --no-same-permissions --no-overwrite-dir"
+        )
+        # Merge stderr into stdout so a single read drains all diagnostics
+        stdout.channel.set_combine_stderr(True)
+        with tarfile.open(fileobj=stdin, mode="w|gz") as tar:
+            # Add the folder's children, not the folder itself, so the archive
+            # has no "." entry carrying the local directory's owner and mode
+            for name in os.listdir(local_path):
+                tar.add(os.path.join(local_path, name), arcname=name)
+        stdin.flush()
+        stdin.channel.shutdown_write()
+
+        output = stdout.read().decode("utf-8", errors="replace").strip()
+        exit_status = stdout.channel.recv_exit_status()
+        if exit_status != 0:
+            raise IOError(f"remote tar exited with status {exit_status}: {output}")
+        logger.debug("Uploaded: %s -> %s (tar stream)", local_path, remote_path)
+
+    def _upload_via_sftp(self, local_path, remote_path):
+        """Upload the folder file by file over SFTP."""
+        try:
+            # A large window keeps the pipelined writes flowing on high-latency links
+            sftp = paramiko.SFTPClient.from_transport(
+                self.ssh_client.get_transport(), window_size=SFTP_WINDOW_SIZE
+            )
             try:
-                sftp.stat(remote_path)
-            except IOError:
-                sftp.mkdir(remote_path)
-
-            # Recursively upload the folder
-            for root, _, files in os.walk(local_path):
-                # Compute the relative path and convert it to UNIX style
-                relative_path = os.path.relpath(root, local_path).replace("\\", "/")
-                remote_dir = (
-                    remote_path + "/" + relative_path
-                    if relative_path != "."
-                    else remote_path
-                )
-
-                # Ensure the remote directory exists
-                try:
-                    sftp.stat(remote_dir)
-                except IOError:
-                    sftp.mkdir(remote_dir)
-
-                # Upload files
-                for file in files:
-                    local_file = os.path.join(root, file)
-                    remote_file = remote_dir + "/" + file  # Always use UNIX-style paths
-                    sftp.put(local_file, remote_file)
-                    logger.debug(f"Uploaded: {local_file} -> {remote_file}")
+                # Remote directories known to exist, and those created here
+                known_dirs = set()
+                created_dirs = set()
+
+                def ensure_remote_dir(path):
+                    if path in known_dirs:
+                        return
+                    # A directory created during this upload has no children yet
+                    if path.rsplit("/", 1)[0] in created_dirs:
+                        sftp.mkdir(path)
+                        created_dirs.add(path)
+                    else:
+                        try:
+                            sftp.stat(path)
+                        except IOError:
+                            sftp.mkdir(path)
+                            created_dirs.add(path)
+                    known_dirs.add(path)
+
+                # Ensure the remote path exists
+                ensure_remote_dir(remote_path)
 
+                # Recursively upload the folder
+                for root, _, files in os.walk(local_path):
+                    # Compute the relative path and convert it to UNIX style
+                    relative_path = os.path.relpath(root, local_path).replace("\\", "/")
+                    remote_dir = (
+                        remote_path + "/" + relative_path
+                        if relative_path != "."
+                        else remote_path
+                    )
+
+                    # Ensure the remote directory exists
+                    ensure_remote_dir(remote_dir)
+
+                    # Upload files
+                    for file in files:
+                        local_file = os.path.join(root, file)
+                        remote_file = remote_dir + "/" + file  # Always use UNIX-style paths
+                        # Skip the confirming stat round trip after each file
+                        sftp.put(local_file, remote_file, confirm=False)
+                        logger.debug("Uploaded: %s -> %s", local_file, remote_file)
+            finally:
                 sftp.close()
-                return f"Successfully uploaded folder: {local_path} -> {remote_path}"
+
+            return f"Successfully uploaded folder: {local_path} -> {remote_path}"
 
         except Exception as e:
             logger.error(f"Failed to upload folder: {str(e)}")
@@ -3,7 +3,10 @@ from agent.workflow import Workflow
 from datetime import datetime
 import sys
 import os
+import queue
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
 
 
 def setup_logging():
@@ -16,18 +19,9 @@ def setup_logging():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file = os.path.join(log_dir, f"log_{timestamp}.log")
     
-    # Configure logging
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
-    # Set file logging level to DEBUG and console level to INFO
-    file_handler = logging.FileHandler(log_file,encoding='utf-8')
+    # File logging captures DEBUG; console logging shows INFO and above.
+    # delay=True postpones opening the file until the first record is written.
+    file_handler = logging.FileHandler(log_file, encoding='utf-8', delay=True)
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
     
@@ -35,13 +29,19 @@ def setup_logging():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
     
-    # Remove default handlers and attach the custom ones
-    root_logger = logging.getLogger()
-    for handler in root_logger.handlers[:]:
-        root_logger.removeHandler(handler)
+    # Records are queued by the caller and written by a background listener thread
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)  # Flush pending records on exit
     
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    # Attach the queue handler to a clean root logger
+    root_logger = logging.getLogger()
+    root_logger.handlers.clear()
+    root_logger.setLevel(logging.DEBUG)
+    root_logger.addHandler(QueueHandler(log_queue))
     
     # Tweak third-party logger levels
     logging.getLogger("LiteLLM").setLevel(logging.WARNING)
@@ -52,11 +52,12 @@ def setup_logging():
 if __name__ == "__main__":
     setup_logging()
     logger = logging.getLogger(__name__)
-    config: dict = Config.load_config()
+    config: dict = Config().config
     print("If the challenge includes attachments, place them in the project root under the attachments directory.")
     print("Please enter the challenge title and description. Multi-line input is supported.")
     print("Press Enter, then finish with Ctrl+D (or Ctrl+Z followed by Enter on Windows).")
     question = sys.stdin.read().strip()
-    logger.debug(f"Challenge content: {question}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Challenge content: %s", question)
     result = Workflow(config=config).solve(question)
     logger.info(f"Final result: {result}")